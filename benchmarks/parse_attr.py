@@ -0,0 +1,81 @@
+"""Micro-benchmark for ``LDIFParser._parse_attr``.
+
+Compares the current implementation with the previous one (decode the
+attribute type on every line, two slice-and-startswith checks, decode
+every value through ``_decode_value``) on the lines of a typical
+inetOrgPerson entry.
+
+Usage: python benchmarks/parse_attr.py
+"""
+
+from __future__ import print_function, unicode_literals
+
+import base64
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import ldif3  # noqa: E402
+
+
+LINES = [
+    b'dn: uid=jdoe,ou=people,dc=example,dc=com',
+    b'objectClass: top',
+    b'objectClass: person',
+    b'objectClass: organizationalPerson',
+    b'objectClass: inetOrgPerson',
+    b'uid: jdoe',
+    b'cn: John Doe',
+    b'sn: Doe',
+    b'givenName: John',
+    b'mail: john.doe@example.com',
+    b'telephoneNumber: +1 555 0100',
+    b'title: Engineer',
+    b'description: Some person entry',
+]
+
+NUMBER = 5000
+REPEAT = 15
+
+
+class LegacyParser(ldif3.LDIFParser):
+    def _parse_attr(self, line):
+        colon_pos = line.index(b':')
+        attr_type = line[0:colon_pos].decode('ascii')
+
+        if line[colon_pos:].startswith(b'::'):
+            attr_value = base64.b64decode(line[colon_pos + 2:])
+        elif line[colon_pos:].startswith(b':<'):
+            attr_value = b''
+        else:
+            attr_value = line[colon_pos + 1:].strip()
+
+        return self._decode_value(attr_type, attr_value)
+
+
+def main():
+    parsers = [
+        ('before', LegacyParser(None)),
+        ('after', ldif3.LDIFParser(None)),
+    ]
+    results = dict((name, []) for name, parser in parsers)
+
+    # interleave runs to reduce the effect of noise
+    for _ in range(REPEAT):
+        for name, parser in parsers:
+            parse_attr = parser._parse_attr
+            t = timeit.timeit(
+                lambda: [parse_attr(line) for line in LINES], number=NUMBER)
+            results[name].append(t / NUMBER / len(LINES) * 1e9)
+
+    before = min(results['before'])
+    for name, parser in parsers:
+        best = min(results[name])
+        print('%-6s %6.0f ns/line (%+.0f%%)' % (
+            name, best, (best - before) / before * 100))
+
+
+if __name__ == '__main__':
+    main()
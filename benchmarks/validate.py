@@ -0,0 +1,82 @@
+"""Benchmark for ``LDIFValidator.validate``.
+
+Compares the validator with ``LDIFParser.parse`` on typical inetOrgPerson
+entries, and measures the validator alone on delete and modify change
+records (which are checked line by line) at growing input sizes, where
+the time should grow linearly.
+
+Usage: python benchmarks/validate.py
+"""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import sys
+import timeit
+from io import BytesIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import ldif3  # noqa: E402
+
+
+ENTRY = (
+    'dn: uid=user%(i)i,ou=people,dc=example,dc=com\n'
+    'objectClass: top\n'
+    'objectClass: person\n'
+    'objectClass: organizationalPerson\n'
+    'objectClass: inetOrgPerson\n'
+    'uid: user%(i)i\n'
+    'cn: User %(i)i\n'
+    'sn: User\n'
+    'mail: user%(i)i@example.com\n'
+    'telephoneNumber: +1 555 0100\n'
+    '\n')
+
+DELETE = (
+    'dn: uid=user%(i)i,ou=people,dc=example,dc=com\n'
+    'changetype: delete\n'
+    '\n')
+
+MODIFY = (
+    'dn: uid=user%(i)i,ou=people,dc=example,dc=com\n'
+    'changetype: modify\n'
+    'replace: mail\n'
+    'mail: user%(i)i@example.com\n'
+    '-\n'
+    '\n')
+
+REPEAT = 5
+
+
+def make_input(template, count):
+    return ''.join(template % {'i': i} for i in range(count)).encode(
+        'ascii')
+
+
+def best(func):
+    return min(timeit.repeat(func, number=1, repeat=REPEAT))
+
+
+def validate(data):
+    return lambda: list(ldif3.LDIFValidator(BytesIO(data)).validate())
+
+
+def parse(data):
+    return lambda: list(ldif3.LDIFParser(BytesIO(data)).parse())
+
+
+def main():
+    data = make_input(ENTRY, 20000)
+    print('entries  %5.1f MB  parse %6.3fs  validate %6.3fs' % (
+        len(data) / 1e6, best(parse(data)), best(validate(data))))
+
+    for name, template in [('delete', DELETE), ('modify', MODIFY)]:
+        for count in [10000, 20000, 40000, 80000]:
+            data = make_input(template, count)
+            print('%-7s %6i records  validate %6.3fs' % (
+                name, count, best(validate(data))))
+
+
+if __name__ == '__main__':
+    main()
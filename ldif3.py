@@ -2,10 +2,20 @@
 
 from __future__ import unicode_literals
 
+import argparse
 import base64
+import heapq
+import itertools
+import json
+import multiprocessing
 import re
 import logging
-from collections import OrderedDict
+import sys
+import tempfile
+import time
+import zlib
+from array import array
+from collections import OrderedDict, deque, namedtuple
 
 try:  # pragma: nocover
     from urlparse import urlparse
@@ -22,6 +32,14 @@ __all__ = [
     # classes
     'LDIFWriter',
     'LDIFParser',
+    'LDIFFeedParser',
+    'DNTree',
+    'LDIFMerger',
+    'LDIFBatch',
+    'ListColumn',
+    'LDIFValidator',
+    'Checkpoint',
+    'ValidationError',
 ]
 
 log = logging.getLogger('ldif3')
@@ -37,7 +55,9 @@ LDIF_PATTERN = ('^((dn(:|::) %(DN_PATTERN)s)|(%(ATTRTYPE_PATTERN)'
     's(:|::) .*)$)+' % vars())
 
 MOD_OPS = ['add', 'delete', 'replace']
-CHANGE_TYPES = ['add', 'delete', 'modify', 'modrdn']
+CHANGE_TYPES = ['add', 'delete', 'modify', 'modrdn', 'moddn']
+MERGE_POLICIES = ['last', 'union', 'error']
+ATTR_TYPE_CACHE_SIZE = 1000
 
 
 def is_dn(s):
@@ -48,12 +68,96 @@ def is_dn(s):
     return rm is not None and rm.group(0) == s
 
 
+def _strip_rdn(s):
+    """Strip whitespace around s, but keep an escaped trailing space."""
+    s = s.lstrip()
+    stripped = s.rstrip()
+    backslashes = len(stripped) - len(stripped.rstrip('\\'))
+    if backslashes % 2 and len(stripped) < len(s):
+        stripped = s[:len(stripped) + 1]
+    return stripped
+
+
+def split_dn(s):
+    """Return a list of the RDNs of the LDAP DN s, starting with the leaf.
+
+    Escaped and quoted commas are respected. Unescaped whitespace around
+    the RDNs is stripped.
+    """
+    if s == '':
+        return []
+    rdns = []
+    start = 0
+    escaped = False
+    quoted = False
+    for i, c in enumerate(s):
+        if escaped:
+            escaped = False
+        elif c == '\\':
+            escaped = True
+        elif c == '"':
+            quoted = not quoted
+        elif c == ',' and not quoted:
+            rdns.append(_strip_rdn(s[start:i]))
+            start = i + 1
+    rdns.append(_strip_rdn(s[start:]))
+    return rdns
+
+
+ATTRDESC_RE = re.compile(
+    br'^([0-9]+(\.[0-9]+)*|[A-Za-z][A-Za-z0-9-]*)(;[A-Za-z0-9-]+)*$')
+BASE64_RE = re.compile(
+    br'^([A-Za-z0-9+/]{4})*([A-Za-z0-9+/]{2}==|[A-Za-z0-9+/]{3}=)?$')
+UNSAFE_INIT_VALUES = [b':', b'<']
+MODRDN_ATTR_TYPES = [b'newrdn', b'deleteoldrdn', b'newsuperior']
+
+
+def dn_sort_key(s):
+    """Return a key to sort DNs hierarchically.
+
+    RDNs are compared case-insensitively, starting at the root, so parents
+    are sorted before their children.
+    """
+    return tuple(rdn.lower() for rdn in reversed(split_dn(s)))
+
+
 UNSAFE_STRING_PATTERN = (
     '(^[^\x01-\x09\x0b-\x0c\x0e-\x1f\x21-\x39\x3b\x3d-\x7f]'
     '|[^\x01-\x09\x0b-\x0c\x0e-\x7f])')
 UNSAFE_STRING_RE = re.compile(UNSAFE_STRING_PATTERN)
 
 
+class Checkpoint(namedtuple('Checkpoint', ['offset', 'line_counter',
+        'records_read'])):
+    """Position of a record boundary in an LDIF file.
+
+    Pass this to :class:`LDIFParser` to resume parsing at that boundary.
+    """
+
+    __slots__ = ()
+
+
+class ValidationError(namedtuple('ValidationError', ['line', 'offset',
+        'message'])):
+    """Error found by :class:`LDIFValidator`.
+
+    ``line`` is the 1-based number and ``offset`` the byte offset of the
+    physical line where the offending (unfolded) line starts.
+    """
+
+    __slots__ = ()
+
+
+def _strip_line_sep(s):
+    """Strip trailing line separators from s, but no other whitespaces."""
+    if s[-2:] == b'\r\n':
+        return s[:-2]
+    elif s[-1:] == b'\n':
+        return s[:-1]
+    else:
+        return s
+
+
 def lower(l):
     """Return a list with the lowercased items of l."""
     return [i.lower() for i in l or []]
@@ -128,9 +232,7 @@ class LDIFWriter(object):
         if self._needs_base64_encoding(attr_type, attr_value):
             if not isinstance(attr_value, bytes):
                 attr_value = attr_value.encode(self._encoding)
-            encoded = base64.encodestring(attr_value)\
-                .replace(b'\n', b'')\
-                .decode('ascii')
+            encoded = base64.b64encode(attr_value).decode('ascii')
             line = ':: '.join([attr_type, encoded])
         else:
             line = ': '.join([attr_type, attr_value])
@@ -228,16 +330,15 @@ class LDIFParser(object):
     :type strict: boolean
     :param strict: If set to ``False``, recoverable parse errors will produce
         log warnings rather than exceptions.
+
+    :type checkpoint: Checkpoint
+    :param checkpoint: Resume parsing at a record boundary that has been
+        recorded by a previous parser (see :attr:`checkpoint`). The input
+        file must be seekable and the checkpoint must have been created from
+        the same input.
     """
 
-    def _strip_line_sep(self, s):
-        """Strip trailing line separators from s, but no other whitespaces."""
-        if s[-2:] == b'\r\n':
-            return s[:-2]
-        elif s[-1:] == b'\n':
-            return s[:-1]
-        else:
-            return s
+    _strip_line_sep = staticmethod(_strip_line_sep)
 
     def __init__(
             self,
@@ -246,7 +347,8 @@ class LDIFParser(object):
             process_url_schemes=[],
             line_sep=b'\n',
             encoding='utf8',
-            strict=True):
+            strict=True,
+            checkpoint=None):
         self._input_file = input_file
         self._process_url_schemes = lower(process_url_schemes)
         self._ignored_attr_types = lower(ignored_attr_types)
@@ -254,9 +356,27 @@ class LDIFParser(object):
         self._encoding = encoding
         self._strict = strict
 
-        self.line_counter = 0  #: number of lines that have been read
-        self.byte_counter = 0  #: number of bytes that have been read
-        self.records_read = 0  #: number of records that have been read
+        # raw attribute type -> decoded attribute type
+        self._attr_types = {}
+
+        if checkpoint is None:
+            checkpoint = Checkpoint(0, 0, 0)
+        else:
+            self._input_file.seek(checkpoint.offset)
+
+        #: number of lines that have been read
+        self.line_counter = checkpoint.line_counter
+        #: number of bytes that have been read
+        self.byte_counter = checkpoint.offset
+        #: number of records that have been read
+        self.records_read = checkpoint.records_read
+
+        #: :class:`Checkpoint` after the most recently yielded record
+        self.checkpoint = checkpoint
+
+    def _set_checkpoint(self):
+        self.checkpoint = Checkpoint(
+            self.byte_counter, self.line_counter, self.records_read)
 
     def _iter_unfolded_lines(self):
         """Iter input unfoled lines. Skip comments."""
@@ -269,6 +389,8 @@ class LDIFParser(object):
 
             nextline = self._input_file.readline()
             while nextline and nextline[:1] == b' ':
+                self.line_counter += 1
+                self.byte_counter += len(nextline)
                 line += self._strip_line_sep(nextline)[1:]
                 nextline = self._input_file.readline()
 
@@ -284,13 +406,15 @@ class LDIFParser(object):
                 lines.append(line)
             elif lines:
                 self.records_read += 1
+                self._set_checkpoint()
                 yield lines
                 lines = []
         if lines:
             self.records_read += 1
+            self._set_checkpoint()
             yield lines
 
-    def _decode_value(self, attr_type, attr_value):
+    def _decode_value(self, attr_type, attr_value, decode=True):
         if attr_type == u'dn':
             try:
                 return attr_type, attr_value.decode('utf8')
@@ -298,7 +422,7 @@ class LDIFParser(object):
                 self._error(err)
                 return attr_type, attr_value.decode('utf8', 'ignore')
 
-        elif self._encoding is not None:
+        elif decode and self._encoding is not None:
             try:
                 return attr_type, attr_value.decode(self._encoding)
             except UnicodeError:
@@ -306,14 +430,23 @@ class LDIFParser(object):
 
         return attr_type, attr_value
 
-    def _parse_attr(self, line):
-        """Parse a single attribute type/value pair."""
-        colon_pos = line.index(b':')
-        attr_type = line[0:colon_pos].decode('ascii')
+    def _parse_attr(self, line, decode=True):
+        """Parse a single attribute type/value pair.
 
-        if line[colon_pos:].startswith(b'::'):
-            attr_value = base64.decodestring(line[colon_pos + 2:])
-        elif line[colon_pos:].startswith(b':<'):
+        If decode is false, all values except dn are returned as bytes.
+        """
+        colon_pos = line.index(b':')
+        raw_attr_type = line[:colon_pos]
+        attr_type = self._attr_types.get(raw_attr_type)
+        if attr_type is None:
+            attr_type = raw_attr_type.decode('ascii')
+            if len(self._attr_types) < ATTR_TYPE_CACHE_SIZE:
+                self._attr_types[raw_attr_type] = attr_type
+
+        marker = line[colon_pos + 1:colon_pos + 2]
+        if marker == b':':
+            attr_value = base64.b64decode(line[colon_pos + 2:])
+        elif marker == b'<':
             url = line[colon_pos + 2:].strip()
             attr_value = b''
             if self._process_url_schemes:
@@ -322,8 +455,16 @@ class LDIFParser(object):
                     attr_value = urlopen(url.decode('ascii')).read()
         else:
             attr_value = line[colon_pos + 1:].strip()
+            # fast path for the common case of a plain value
+            if attr_type != 'dn':
+                if decode and self._encoding is not None:
+                    try:
+                        return attr_type, attr_value.decode(self._encoding)
+                    except UnicodeError:
+                        pass
+                return attr_type, attr_value
 
-        return self._decode_value(attr_type, attr_value)
+        return self._decode_value(attr_type, attr_value, decode)
 
     def _error(self, msg):
         if self._strict:
@@ -348,13 +489,21 @@ class LDIFParser(object):
         if attr_value not in CHANGE_TYPES:
             self._error('changetype value %s is invalid.' % attr_value)
 
-    def _parse_entry_record(self, lines):
-        """Parse a single entry record from a list of lines."""
+    def _parse_record_attrs(self, lines, decode=True):
+        """Parse the lines of a single entry record.
+
+        If decode is false, all values except dn are returned as bytes.
+
+        :rtype: Tuple[string, List[Tuple[string, Union[string, bytes]]]]
+        :return: (dn, list of (attr_type, attr_value))
+        """
         dn = None
-        entry = OrderedDict()
+        attrs = []
+        parse_attr = self._parse_attr
 
         for line in lines:
-            attr_type, attr_value = self._parse_attr(line)
+            attr = parse_attr(line, decode)
+            attr_type, attr_value = attr
 
             if attr_type == 'dn':
                 self._check_dn(dn, attr_value)
@@ -367,10 +516,20 @@ class LDIFParser(object):
                         'with "dn:": %s' % attr_type)
                 if attr_value is not None and \
                          attr_type.lower() not in self._ignored_attr_types:
-                    if attr_type in entry:
-                        entry[attr_type].append(attr_value)
-                    else:
-                        entry[attr_type] = [attr_value]
+                    attrs.append(attr)
+
+        return dn, attrs
+
+    def _parse_entry_record(self, lines):
+        """Parse a single entry record from a list of lines."""
+        dn, attrs = self._parse_record_attrs(lines)
+        entry = OrderedDict()
+
+        for attr_type, attr_value in attrs:
+            if attr_type in entry:
+                entry[attr_type].append(attr_value)
+            else:
+                entry[attr_type] = [attr_value]
 
         return dn, entry
 
@@ -382,3 +541,1479 @@ class LDIFParser(object):
         """
         for block in self._iter_blocks():
             yield self._parse_entry_record(block)
+
+    def parse_batches(self, size=1000, attr_types=None):
+        """Iterate LDIF entry records in column-oriented batches.
+
+        This avoids creating a dictionary for every entry record.
+
+        :type size: int
+        :param size: maximum number of records per batch
+
+        :type attr_types: List[string]
+        :param attr_types: If given, only these attribute types are included
+            (compared case-insensitively) and every batch has exactly these
+            columns. Otherwise, every batch has a column for each attribute
+            type that occurs in it.
+
+        :rtype: Iterator[LDIFBatch]
+        """
+        return self._batches(self._iter_blocks(), size, attr_types)
+
+    def _batches(self, blocks, size, attr_types):
+        """Iterate batches of the records in blocks."""
+        # values are kept as bytes; the batch only decodes them when they
+        # are accessed
+        batch = LDIFBatch(attr_types, self._encoding)
+        for block in blocks:
+            dn, attrs = self._parse_record_attrs(block, decode=False)
+            if dn is None:
+                # e.g. a standalone "version: 1" record
+                if attrs:
+                    log.warning('Skipping record without dn.')
+                continue
+            batch._append_row(dn, attrs)
+            if batch.num_rows >= size:
+                yield batch
+                batch = LDIFBatch(attr_types, self._encoding)
+        if batch.num_rows:
+            yield batch
+
+
+class LDIFFeedParser(LDIFParser):
+    """Incrementally parse LDIF entry records from chunks of bytes.
+
+    Unlike :class:`LDIFParser`, this does not read from a file object.
+    Instead, data is pushed with :meth:`feed` as it arrives and completed
+    records can be fetched with :meth:`records`. Chunks may be split at
+    arbitrary positions, e.g. in the middle of a folded line or between
+    ``\\r`` and ``\\n``.
+
+    Only the current line and the completed but not yet fetched records
+    are buffered, so memory usage does not depend on the size of the stream
+    as long as completed records are fetched regularly. Records are parsed
+    when they are fetched, so parse errors are raised from :meth:`records`.
+    The remaining records can still be fetched after an error.
+
+    All arguments have the same meaning as for :class:`LDIFParser`.
+    """
+
+    def __init__(
+            self,
+            ignored_attr_types=[],
+            process_url_schemes=[],
+            line_sep=b'\n',
+            encoding='utf8',
+            strict=True):
+        super(LDIFFeedParser, self).__init__(
+            None,
+            ignored_attr_types=ignored_attr_types,
+            process_url_schemes=process_url_schemes,
+            line_sep=line_sep,
+            encoding=encoding,
+            strict=strict)
+
+        self._partial = []  # pieces of an incomplete physical line
+        self._line = None  # pieces of the current unfolded line
+        self._lines = []  # unfolded lines of the current record
+        self._blocks = deque()  # (lines, checkpoint) of completed records
+        self._closed = False
+
+    def _flush_line(self):
+        """Add the current unfolded line to the current record."""
+        if self._line is not None:
+            line = b''.join(self._line)
+            self._line = None
+            if not line.startswith(b'#'):
+                self._lines.append(line)
+
+    def _flush_record(self):
+        """Queue the current record for parsing."""
+        self._flush_line()
+        if self._lines:
+            self.records_read += 1
+            checkpoint = Checkpoint(
+                self.byte_counter, self.line_counter, self.records_read)
+            self._blocks.append((self._lines, checkpoint))
+            self._lines = []
+
+    def _feed_line(self, line):
+        """Process a single physical line."""
+        self.line_counter += 1
+        self.byte_counter += len(line)
+
+        line = self._strip_line_sep(line)
+        if not line:
+            self._flush_record()
+        elif line[:1] == b' ' and self._line is not None:
+            self._line.append(line[1:])
+        else:
+            self._flush_line()
+            self._line = [line]
+
+    def feed(self, data):
+        """Feed a chunk of LDIF data to the parser.
+
+        :type data: Union[bytes, bytearray, memoryview]
+        :param data: Arbitrary chunk of the input
+        """
+        if self._closed:
+            raise ValueError('feed() called after close()')
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+
+        start = 0
+        end = data.find(b'\n')
+        while end != -1:
+            self._partial.append(data[start:end + 1])
+            line = b''.join(self._partial)
+            self._partial = []
+            self._feed_line(line)
+            start = end + 1
+            end = data.find(b'\n', start)
+        if start < len(data):
+            self._partial.append(data[start:])
+
+    def close(self):
+        """Signal the end of the input and process any buffered data."""
+        if not self._closed:
+            if self._partial:
+                line = b''.join(self._partial)
+                self._partial = []
+                self._feed_line(line)
+            self._flush_record()
+            self._closed = True
+
+    def records(self):
+        """Iterate the entry records that have been completed so far.
+
+        :rtype: Iterator[Tuple[string, Dict]]
+        :return: (dn, entry)
+        """
+        for lines in self._iter_completed():
+            yield self._parse_entry_record(lines)
+
+    def _iter_completed(self):
+        """Iterate the lines of the completed records and remove them."""
+        while self._blocks:
+            lines, self.checkpoint = self._blocks.popleft()
+            yield lines
+
+    def parse(self):
+        """Same as :meth:`records`."""
+        return self.records()
+
+    def parse_batches(self, size=1000, attr_types=None):
+        """Iterate the entry records that have been completed so far in
+        column-oriented batches.
+
+        The arguments have the same meaning as for
+        :meth:`LDIFParser.parse_batches`. The last batch may be smaller
+        than size even if more records are fed later.
+
+        :rtype: Iterator[LDIFBatch]
+        """
+        return self._batches(self._iter_completed(), size, attr_types)
+
+
+class ListColumn(object):
+    """Column of value lists in the layout used by Apache Arrow.
+
+    The raw values of all rows are concatenated in ``data``. Value ``j``
+    is ``data[value_offsets[j]:value_offsets[j + 1]]`` and the values of row
+    ``i`` are the values ``offsets[i]`` to ``offsets[i + 1] - 1``.
+    Indexing a column returns the values of a row, decoded like
+    :meth:`LDIFParser.parse` does.
+    """
+
+    __slots__ = ['offsets', 'value_offsets', 'data', '_encoding']
+
+    def __init__(self, encoding='utf8', rows=0):
+        self.offsets = array('i', [0]) * (rows + 1)
+        self.value_offsets = array('i', [0])
+        self.data = bytearray()
+        self._encoding = encoding
+
+    def _append_value(self, attr_value):
+        self.data += attr_value
+        self.value_offsets.append(len(self.data))
+
+    def _end_row(self):
+        self.offsets.append(len(self.value_offsets) - 1)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def raw(self, i):
+        """Return the values of row i as bytes."""
+        data = self.data
+        value_offsets = self.value_offsets
+        return [bytes(data[value_offsets[j]:value_offsets[j + 1]])
+            for j in range(self.offsets[i], self.offsets[i + 1])]
+
+    def _decode(self, attr_value):
+        if self._encoding is not None:
+            try:
+                return attr_value.decode(self._encoding)
+            except UnicodeError:
+                pass
+        return attr_value
+
+    def __getitem__(self, i):
+        return [self._decode(attr_value) for attr_value in self.raw(i)]
+
+
+def _text(value):
+    """Return value as a string, base64-encoding it if it is binary."""
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode('ascii')
+    return value
+
+
+def _csv_field(s):
+    """Quote s for use in a CSV file if necessary."""
+    if '"' in s or ',' in s or '\n' in s or '\r' in s:
+        return '"' + s.replace('"', '""') + '"'
+    return s
+
+
+class LDIFBatch(object):
+    """Column-oriented batch of entry records.
+
+    Batches are created by :meth:`LDIFParser.parse_batches`.
+    """
+
+    def __init__(self, attr_types=None, encoding='utf8'):
+        self.dn = []  #: list of distinguished names
+        #: ordered mapping of attribute types to :class:`ListColumn`
+        self.columns = OrderedDict()
+
+        self._encoding = encoding
+        self._fixed = attr_types is not None
+        self._lookup = {}  # attribute type -> column or None
+        if self._fixed:
+            for attr_type in attr_types:
+                self.columns[attr_type] = ListColumn(encoding)
+
+    @property
+    def num_rows(self):
+        """Number of records in this batch."""
+        return len(self.dn)
+
+    def _get_column(self, attr_type):
+        if self._fixed:
+            for name, column in self.columns.items():
+                if name.lower() == attr_type.lower():
+                    return column
+            return None
+        else:
+            column = ListColumn(self._encoding, self.num_rows)
+            self.columns[attr_type] = column
+            return column
+
+    def _append_row(self, dn, attrs):
+        """Append a record with raw attribute values."""
+        lookup = self._lookup
+        for attr_type, attr_value in attrs:
+            try:
+                column = lookup[attr_type]
+            except KeyError:
+                column = self._get_column(attr_type)
+                lookup[attr_type] = column
+            if column is not None:
+                column._append_value(attr_value)
+        for column in self.columns.values():
+            column._end_row()
+        self.dn.append(dn)
+
+    def write_csv(self, output_file, header=True, value_sep='|'):
+        """Write the batch as CSV with one row per record.
+
+        Binary values are base64-encoded.
+
+        :type output_file: file-like object in text mode
+        :param output_file: File for output
+
+        :type header: boolean
+        :param header: whether to write a header row
+
+        :type value_sep: string
+        :param value_sep: separator for multiple values in one cell
+        """
+        columns = list(self.columns.values())
+        if header:
+            output_file.write(','.join(_csv_field(name)
+                for name in ['dn'] + list(self.columns.keys())) + '\r\n')
+        for i, dn in enumerate(self.dn):
+            output_file.write(','.join([_csv_field(dn)] + [
+                _csv_field(value_sep.join(_text(v) for v in column[i]))
+                for column in columns]) + '\r\n')
+
+    def write_ndjson(self, output_file):
+        """Write the batch as newline-delimited JSON.
+
+        Each line contains an object with the ``dn`` and a list of values
+        for each attribute type that occurs in the record. Binary values are
+        base64-encoded.
+
+        :type output_file: file-like object in text mode
+        :param output_file: File for output
+        """
+        names = [json.dumps(name) for name in self.columns.keys()]
+        columns = list(self.columns.values())
+        for i, dn in enumerate(self.dn):
+            parts = ['"dn": ' + json.dumps(dn)]
+            for name, column in zip(names, columns):
+                values = column[i]
+                if values:
+                    parts.append(name + ': ' + json.dumps(
+                        [_text(value) for value in values]))
+            output_file.write('{' + ', '.join(parts) + '}\n')
+
+    def to_arrow(self):
+        """Convert the batch to a ``pyarrow.RecordBatch``.
+
+        This requires pyarrow to be installed. The column buffers are passed
+        to pyarrow without converting the values. Values are strings if they
+        are valid UTF-8 and the batch was parsed with that encoding,
+        otherwise binary.
+        """
+        import pyarrow
+
+        names = ['dn']
+        arrays = [pyarrow.array(self.dn, pyarrow.string())]
+        for name, column in self.columns.items():
+            values = pyarrow.Array.from_buffers(
+                pyarrow.binary(), len(column.value_offsets) - 1, [
+                    None,
+                    pyarrow.py_buffer(column.value_offsets),
+                    pyarrow.py_buffer(bytes(column.data))])
+            if self._encoding in ['utf8', 'utf-8']:
+                try:
+                    values = values.cast(pyarrow.string())
+                except pyarrow.ArrowInvalid:
+                    pass
+            offsets = pyarrow.Array.from_buffers(
+                pyarrow.int32(), len(column.offsets), [
+                    None, pyarrow.py_buffer(column.offsets)])
+            names.append(name)
+            arrays.append(pyarrow.ListArray.from_arrays(offsets, values))
+        return pyarrow.RecordBatch.from_arrays(arrays, names=names)
+
+
+class _DNNode(object):
+    __slots__ = ['parent', 'children', 'dn', 'entry']
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.children = None  # most nodes are leaves
+        self.dn = None  # the dn the entry was added with
+        self.entry = None
+
+
+class DNTree(object):
+    """Index of entry records by their position in the DN hierarchy.
+
+    Nodes are keyed by their lowercased RDN, so RDNs are compared
+    case-insensitively. The RDNs of inner nodes are interned, so shared
+    suffixes are stored once. Each entry keeps the DN it was added with,
+    which is the DN that is returned for it.
+
+    Nodes for DNs that have not been added themselves (e.g. because the
+    input does not contain the parent of some entry) are kept as
+    placeholders and are never returned.
+
+    Build the tree in a streaming fashion from a parser::
+
+        tree = DNTree()
+        tree.update(LDIFParser(open('data.ldif', 'rb')).parse())
+    """
+
+    def __init__(self):
+        self._root = _DNNode(None)
+        self._strings = {}
+        self._len = 0
+
+    def _intern(self, s):
+        return self._strings.setdefault(s, s)
+
+    def _find(self, dn):
+        node = self._root
+        for rdn in reversed(split_dn(dn)):
+            if node.children is None:
+                return None
+            node = node.children.get(rdn.lower())
+            if node is None:
+                return None
+        return node
+
+    def add(self, dn, entry):
+        """Add or replace an entry record.
+
+        :type dn: string
+        :param dn: distinguished name
+
+        :type entry: Dict[string, List[string]]
+        :param entry: Dictionary holding an entry
+        """
+        if dn is None:
+            raise ValueError('dn must not be None')
+        if entry is None:
+            raise ValueError('entry must not be None')
+        rdns = split_dn(dn)
+        node = self._root
+        for i in range(len(rdns) - 1, -1, -1):
+            # leaf RDNs are nearly always unique, so only the RDNs of inner
+            # nodes are added to the interned strings
+            if i:
+                key = self._intern(rdns[i].lower())
+            else:
+                key = rdns[i].lower()
+                key = self._strings.get(key, key)
+            if node.children is None:
+                node.children = {}
+            child = node.children.get(key)
+            if child is None:
+                child = _DNNode(node)
+                node.children[key] = child
+            node = child
+        if node.entry is None:
+            self._len += 1
+        node.dn = dn
+        node.entry = entry
+
+    def update(self, records):
+        """Add all records from an iterable of (dn, entry) tuples, e.g.
+        :meth:`LDIFParser.parse`.
+
+        Records without a dn (e.g. a standalone ``version: 1`` record) are
+        skipped.
+        """
+        for dn, entry in records:
+            if dn is not None:
+                self.add(dn, entry)
+
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, dn):
+        node = self._find(dn)
+        return node is not None and node.entry is not None
+
+    def get(self, dn, default=None):
+        """Return the entry for dn or default if it does not exist."""
+        node = self._find(dn)
+        if node is None or node.entry is None:
+            return default
+        return node.entry
+
+    def parent(self, dn):
+        """Return the DN of the parent entry of dn.
+
+        :rtype: Optional[string]
+        :return: ``None`` if dn or its parent does not exist
+        """
+        node = self._find(dn)
+        if node is None or node.entry is None or node.parent is None:
+            return None
+        return node.parent.dn
+
+    def children(self, dn):
+        """Iterate the DNs of the direct children of dn."""
+        node = self._find(dn)
+        if node is not None and node.children is not None:
+            for child in node.children.values():
+                if child.entry is not None:
+                    yield child.dn
+
+    def _walk(self, node):
+        """Iterate (node, has_ancestor) below node in pre-order."""
+        stack = [(node, False)]
+        while stack:
+            node, has_ancestor = stack.pop()
+            yield node, has_ancestor
+            if node.children is not None:
+                has_ancestor = has_ancestor or node.entry is not None
+                for child in reversed(list(node.children.values())):
+                    stack.append((child, has_ancestor))
+
+    def subtree(self, dn=''):
+        """Iterate entry records below and including dn.
+
+        Parents are always returned before their children.
+
+        :rtype: Iterator[Tuple[string, Dict]]
+        :return: (dn, entry)
+        """
+        node = self._find(dn)
+        if node is not None:
+            for node, _ in self._walk(node):
+                if node.entry is not None:
+                    yield node.dn, node.entry
+
+    def roots(self):
+        """Iterate the DNs of entries that have no ancestor entry."""
+        for node, has_ancestor in self._walk(self._root):
+            if node.entry is not None and not has_ancestor:
+                yield node.dn
+
+    def orphans(self):
+        """Iterate the DNs of entries whose parent entry is missing even
+        though some other ancestor entry exists."""
+        for node, has_ancestor in self._walk(self._root):
+            if node.entry is not None and has_ancestor and \
+                    node.parent.entry is None:
+                yield node.dn
+
+    def unparse(self, writer, dn=''):
+        """Write the subtree below and including dn in hierarchical order.
+
+        :type writer: LDIFWriter
+        :param writer: writer to use for output
+        """
+        for dn, entry in self.subtree(dn):
+            writer.unparse(dn, entry)
+
+
+class LDIFMerger(object):
+    """Merge entry records from several parsers into one DN-sorted stream.
+
+    The inputs must be sorted by :func:`dn_sort_key`. Pass ``sort=True``
+    to sort them on the fly instead. Records without dn (e.g. a standalone
+    ``version: 1`` record) are skipped. Only one record per input is kept in
+    memory (plus ``spill_records`` records when sorting).
+
+    :type parsers: List[LDIFParser]
+    :param parsers: inputs to merge
+
+    :type policy: string
+    :param policy: How to resolve records with the same DN. ``'last'``
+        keeps the record from the last input (or the last one in a single
+        input), ``'union'`` combines the values of all records and
+        ``'error'`` raises a ``ValueError``.
+
+    :type sort: boolean
+    :param sort: Sort each input before merging. Sorted runs of
+        ``spill_records`` records are spilled to temporary files.
+
+    :type spill_records: int
+    :param spill_records: Maximum number of records per input to hold in
+        memory while sorting
+    """
+
+    def __init__(
+            self,
+            parsers,
+            policy='last',
+            sort=False,
+            spill_records=10000):
+        if policy not in MERGE_POLICIES:
+            raise ValueError('Unknown merge policy %s.' % policy)
+
+        self._parsers = parsers
+        self._policy = policy
+        self._sort = sort
+        self._spill_records = spill_records
+
+        self.records_read = 0  #: number of records that have been read
+        self.duplicates = 0  #: number of records that have been merged
+
+    def _spill(self, parser, chunk):
+        """Write a sorted chunk of records to a temporary file."""
+        f = tempfile.TemporaryFile()
+        writer = LDIFWriter(f)
+        encoding = parser._encoding
+        for key, dn, entry in chunk:
+            if encoding is not None:
+                # encode values like they were in the input so they are
+                # decoded the same way when the run is read back
+                entry = OrderedDict(
+                    (attr_type, [value if isinstance(value, bytes)
+                        else value.encode(encoding) for value in values])
+                    for attr_type, values in entry.items())
+            writer.unparse(dn, entry)
+        f.seek(0)
+        return LDIFParser(f, encoding=encoding, strict=parser._strict)
+
+    def _records(self, parser):
+        """Iterate the records of parser, skipping records without dn."""
+        for dn, entry in parser.parse():
+            if dn is not None:
+                yield dn, entry
+            elif entry:
+                log.warning('Skipping record without dn.')
+
+    def _sorted(self, parser):
+        """Iterate the records of parser sorted by DN."""
+        chunk = []
+        runs = []
+        try:
+            for dn, entry in self._records(parser):
+                chunk.append((dn_sort_key(dn), dn, entry))
+                if len(chunk) >= self._spill_records:
+                    chunk.sort(key=lambda item: item[0])
+                    runs.append(self._spill(parser, chunk))
+                    chunk = []
+
+            chunk.sort(key=lambda item: item[0])
+            if not runs:
+                for key, dn, entry in chunk:
+                    yield dn, entry
+            else:
+                if chunk:
+                    runs.append(self._spill(parser, chunk))
+                for key, dn, entry in self._merge_sorted(
+                        [run.parse() for run in runs]):
+                    yield dn, entry
+        finally:
+            for run in runs:
+                run._input_file.close()
+
+    def _merge_sorted(self, inputs):
+        """Merge sorted iterators of records without resolving duplicates.
+
+        Records with the same DN are returned in the order of the inputs.
+
+        :rtype: Iterator[Tuple[Tuple, string, Dict]]
+        :return: (key, dn, entry)
+        """
+        heap = []
+
+        def push(i, it, last_key=None):
+            record = next(it, None)
+            if record is not None:
+                dn, entry = record
+                key = dn_sort_key(dn)
+                if last_key is not None and key < last_key:
+                    raise ValueError('Input %i is not sorted by DN.' % i)
+                heapq.heappush(heap, (key, i, dn, entry, it))
+
+        for i, it in enumerate(inputs):
+            push(i, iter(it))
+
+        while heap:
+            key, i, dn, entry, it = heapq.heappop(heap)
+            push(i, it, key)
+            yield key, dn, entry
+
+    def _resolve(self, dn, entry, new_dn, new_entry):
+        """Resolve two records with the same DN."""
+        self.duplicates += 1
+        if self._policy == 'error':
+            raise ValueError('Duplicate dn: %s' % new_dn)
+        elif self._policy == 'last':
+            return new_dn, new_entry
+        else:
+            # attribute types are case-insensitive; keep the first spelling
+            attr_types = {}
+            for attr_type in entry:
+                attr_types.setdefault(attr_type.lower(), attr_type)
+            for attr_type, values in new_entry.items():
+                key = attr_types.setdefault(attr_type.lower(), attr_type)
+                if key not in entry:
+                    entry[key] = list(values)
+                else:
+                    old_values = entry[key]
+                    for value in values:
+                        if value not in old_values:
+                            old_values.append(value)
+            return dn, entry
+
+    def merge(self):
+        """Iterate merged entry records in DN order.
+
+        :rtype: Iterator[Tuple[string, Dict]]
+        :return: (dn, entry)
+        """
+        if self._sort:
+            inputs = [self._sorted(parser) for parser in self._parsers]
+        else:
+            inputs = [self._records(parser) for parser in self._parsers]
+
+        current = None
+        for key, dn, entry in self._merge_sorted(inputs):
+            self.records_read += 1
+            if current is None:
+                current = key, dn, entry
+            elif current[0] == key:
+                current = (key,) + self._resolve(
+                    current[1], current[2], dn, entry)
+            else:
+                yield current[1], current[2]
+                current = key, dn, entry
+        if current is not None:
+            yield current[1], current[2]
+
+    def unparse(self, writer):
+        """Write all merged entry records.
+
+        :type writer: LDIFWriter
+        :param writer: writer to use for output
+        """
+        for dn, entry in self.merge():
+            writer.unparse(dn, entry)
+
+
+VALIDATE_CHUNK_SIZE = 1 << 20
+BLANK_LINES_RE = re.compile(br'(?:\r?\n)+')
+RECORD_END_RE = re.compile(br'\n(?=\r?\n)')
+FAST_SPECIAL_ATTR_TYPES = frozenset([b'dn', b'changetype', b'control'])
+
+
+def _iter_record_spans(text, pos=0, endpos=None):
+    """Iterate (start, end) of the records in text, skipping blank lines."""
+    if endpos is None:
+        endpos = len(text)
+    while pos < endpos:
+        m = BLANK_LINES_RE.match(text, pos, endpos)
+        if m:
+            pos = m.end()
+            if pos >= endpos:
+                break
+        m = RECORD_END_RE.search(text, pos, endpos)
+        end = m.end() if m else endpos
+        yield pos, end
+        pos = end
+
+
+def _check_content_record(text, attr_types):
+    """Quickly check a raw record that is expected to be a valid entry.
+
+    Return True if it is, None if it only contains comments and False if
+    it has to be checked line by line, e.g. because it is a change record
+    or contains errors.
+    """
+    if b'\r' in text:
+        text = text.replace(b'\r\n', b'\n')
+        if b'\r' in text:
+            return False
+    if text[:1] == b' ':
+        return False
+
+    dn = False
+    attrs = 0
+    for line in text.replace(b'\n ', b'').split(b'\n'):
+        if not line or line[:1] == b'#':
+            continue
+
+        colon_pos = line.find(b':')
+        if colon_pos == -1:
+            return False
+        raw_attr_type = line[:colon_pos]
+        try:
+            attr_type = attr_types[raw_attr_type]
+        except KeyError:
+            if ATTRDESC_RE.match(raw_attr_type):
+                attr_type = raw_attr_type.lower()
+            else:
+                attr_type = None
+            if len(attr_types) < ATTR_TYPE_CACHE_SIZE:
+                attr_types[raw_attr_type] = attr_type
+        if attr_type is None:
+            return False
+
+        marker = line[colon_pos + 1:colon_pos + 2]
+        if marker == b':':
+            value = line[colon_pos + 2:].lstrip(b' ')
+            if not BASE64_RE.match(value):
+                return False
+        elif marker == b'<':
+            if not dn or not line[colon_pos + 2:].strip(b' '):
+                return False
+        else:
+            value = line[colon_pos + 1:].lstrip(b' ')
+            if value[:1] in UNSAFE_INIT_VALUES or b'\x00' in value:
+                return False
+
+        if dn:
+            if attr_type in FAST_SPECIAL_ATTR_TYPES:
+                return False
+            attrs += 1
+        else:
+            if attr_type != b'dn':
+                return False
+            if marker == b':':
+                value = base64.b64decode(value)
+            try:
+                if not is_dn(value.decode('utf8')):
+                    return False
+            except UnicodeError:
+                return False
+            dn = True
+
+    if not dn:
+        return None
+    return attrs > 0
+
+
+class _RecordScanner(object):
+    """Check all records in a chunk with :func:`_check_content_record`.
+
+    Return the records that need to be checked line by line as a list of
+    ``(start, end, ok)`` where ``ok`` is the number of valid entries
+    before the record, and the total number of valid entries.
+    """
+
+    def __init__(self):
+        self._attr_types = {}
+
+    def __call__(self, text):
+        failures = []
+        ok = 0
+        for start, end in _iter_record_spans(text):
+            result = _check_content_record(text[start:end], self._attr_types)
+            if result:
+                ok += 1
+            elif result is not None:
+                failures.append((start, end, ok))
+        return failures, ok
+
+
+class LDIFValidator(object):
+    """Check LDIF input for errors without building entry records.
+
+    This checks the structure described in RFC 2849: line folding,
+    attribute descriptions, base64 values, DN syntax and the structure of
+    change records. Values are not decoded, except for the few that are
+    needed for that (e.g. the DN). All errors are reported in a single
+    pass over the input. Records that look like valid entries are checked
+    as a whole; only the others are checked line by line.
+
+    Plain values that contain non-ASCII characters are accepted, just like
+    :class:`LDIFParser` accepts them.
+
+    :type input_file: file-like object in binary mode
+    :param input_file: file to read the LDIF input from
+
+    :type jobs: int
+    :param jobs: number of worker processes that check the input
+    """
+
+    def __init__(self, input_file, jobs=1):
+        self._input_file = input_file
+        self._jobs = jobs
+
+        self.line_counter = 0  #: number of lines that have been read
+        self.byte_counter = 0  #: number of bytes that have been read
+        self.records_read = 0  #: number of records that have been read
+
+        self._kind = None  # 'content' or 'change'
+        self._errors = []
+        self._chunk_pos = 0  # position in the current chunk
+        self._chunk_lines = 0  # lines in the current chunk before that
+        # raw attribute type -> lowercased attribute type or None if invalid
+        self._attr_types = {}
+        self._reset_record()
+
+    def _reset_record(self):
+        self._pos = None  # (line, offset) of the first line of the record
+        self._dn = False
+        self._changetype = None
+        self._attrs = 0
+        self._mod_attr = None
+        self._modrdn_attrs = set()
+
+    def _error(self, pos, msg):
+        self._errors.append(ValidationError(pos[0], pos[1], msg))
+
+    def _decode(self, marker, value):
+        """Return the raw bytes of a value (or None for URLs)."""
+        if value is None or marker == b'<':
+            return None
+        elif marker == b':':
+            return base64.b64decode(value)
+        return value
+
+    def _check_kind(self, pos, kind):
+        if self._kind is None:
+            self._kind = kind
+        elif self._kind != kind:
+            self._error(pos, 'Mixing content and change records.')
+
+    def _check_dn(self, pos, marker, value):
+        raw = self._decode(marker, value)
+        if raw is None:
+            if marker == b'<':
+                self._error(pos, 'dn must not be a URL.')
+            return
+        try:
+            dn = raw.decode('utf8')
+        except UnicodeError:
+            self._error(pos, 'dn is not a valid UTF-8 string.')
+        else:
+            if not is_dn(dn):
+                self._error(pos, 'No valid string-representation of '
+                    'distinguished name %s.' % dn)
+
+    def _check_changetype(self, pos, marker, value):
+        changetype = (self._decode(marker, value) or b'').decode(
+            'ascii', 'replace')
+        if changetype not in CHANGE_TYPES:
+            self._error(pos, 'changetype value %s is invalid.' % changetype)
+        self._changetype = changetype
+        self._check_kind(pos, 'change')
+
+    def _check_modify(self, pos, attr_type, marker, value):
+        if self._mod_attr is None:
+            if attr_type.decode('ascii') in MOD_OPS:
+                self._mod_attr = (self._decode(marker, value) or b'').lower()
+            else:
+                self._error(pos, 'Expected add:, delete: or replace: '
+                    'in modify record.')
+        elif attr_type != self._mod_attr:
+            if attr_type.decode('ascii') in MOD_OPS:
+                self._error(pos, 'Missing "-" after modification.')
+                self._mod_attr = (self._decode(marker, value) or b'').lower()
+            else:
+                self._error(pos, 'Attribute type %s does not match '
+                    'modification.' % attr_type.decode('ascii'))
+
+    def _check_modrdn(self, pos, attr_type, marker, value):
+        if attr_type not in MODRDN_ATTR_TYPES:
+            self._error(pos, 'Unexpected attribute type %s in %s record.' % (
+                attr_type.decode('ascii'), self._changetype))
+        elif attr_type in self._modrdn_attrs:
+            self._error(pos, 'Two lines starting with %s: in one record.'
+                % attr_type.decode('ascii'))
+        elif attr_type == b'deleteoldrdn' and \
+                self._decode(marker, value) not in [b'0', b'1']:
+            self._error(pos, 'deleteoldrdn value must be 0 or 1.')
+        self._modrdn_attrs.add(attr_type)
+
+    def _check_attr(self, pos, attr_type, marker, value):
+        """Check the position of an attribute in its record."""
+        if self._attrs and self._changetype is None and \
+                attr_type != b'dn' and attr_type != b'changetype':
+            # fast path for the common case of an attribute in an entry
+            self._attrs += 1
+            return
+
+        if self._pos is None:
+            if attr_type == b'version' and self.records_read == 0:
+                version = self._decode(marker, value) or b''
+                if version != b'1':
+                    self._error(pos, 'Unsupported version %s.'
+                        % version.decode('ascii', 'replace'))
+                return
+            self._pos = pos
+            self.records_read += 1
+
+        if not self._dn:
+            self._dn = True
+            if attr_type == b'dn':
+                self._check_dn(pos, marker, value)
+                return
+            self._error(pos, 'First line of record does not start '
+                'with "dn:": %s' % attr_type.decode('ascii'))
+
+        if attr_type == b'dn':
+            self._error(pos, 'Two lines starting with dn: in one record.')
+        elif attr_type == b'changetype':
+            if self._changetype is not None:
+                self._error(pos, 'Two lines starting with changetype: '
+                    'in one record.')
+            elif self._attrs:
+                self._error(pos, 'changetype: must directly follow dn:.')
+            else:
+                self._check_changetype(pos, marker, value)
+        elif attr_type == b'control' and self._changetype is None and \
+                not self._attrs:
+            pass
+        else:
+            if self._changetype is None and not self._attrs:
+                self._check_kind(pos, 'content')
+            self._attrs += 1
+            if self._changetype == 'delete':
+                self._error(pos, 'delete record must not contain '
+                    'attributes.')
+            elif self._changetype == 'modify':
+                self._check_modify(pos, attr_type, marker, value)
+            elif self._changetype in ['modrdn', 'moddn']:
+                self._check_modrdn(pos, attr_type, marker, value)
+
+    def _check_line(self, pos, line):
+        """Check a single unfolded line."""
+        if line[:1] == b'#':
+            return
+
+        if line == b'-' and self._changetype == 'modify':
+            if self._mod_attr is None:
+                self._error(pos, 'Unexpected "-".')
+            self._mod_attr = None
+            return
+
+        colon_pos = line.find(b':')
+        if colon_pos == -1:
+            self._error(pos, 'Missing ":" in line.')
+            return
+
+        raw_attr_type = line[:colon_pos]
+        try:
+            attr_type = self._attr_types[raw_attr_type]
+        except KeyError:
+            if ATTRDESC_RE.match(raw_attr_type):
+                attr_type = raw_attr_type.lower()
+            else:
+                attr_type = None
+            if len(self._attr_types) < ATTR_TYPE_CACHE_SIZE:
+                self._attr_types[raw_attr_type] = attr_type
+        if attr_type is None:
+            self._error(pos, 'Invalid attribute type %s.'
+                % raw_attr_type.decode('ascii', 'replace'))
+            attr_type = raw_attr_type.decode('ascii', 'replace').encode(
+                'ascii', 'replace').lower()
+
+        marker = line[colon_pos + 1:colon_pos + 2]
+        if marker == b':':
+            value = line[colon_pos + 2:].lstrip(b' ')
+            if not BASE64_RE.match(value):
+                self._error(pos, 'Invalid base64 value.')
+                value = None
+        elif marker == b'<':
+            value = line[colon_pos + 2:].strip(b' ')
+            if not value:
+                self._error(pos, 'Missing URL.')
+        else:
+            marker = b''
+            value = line[colon_pos + 1:].lstrip(b' ')
+            if value[:1] in UNSAFE_INIT_VALUES or b'\r' in value or \
+                    b'\x00' in value:
+                self._error(pos, 'Value contains unsafe characters.')
+
+        self._check_attr(pos, attr_type, marker, value)
+
+    def _end_record(self):
+        """Check the record as a whole."""
+        if self._pos is not None:
+            if self._changetype is None and not self._attrs:
+                self._check_kind(self._pos, 'content')
+                self._error(self._pos, 'Record has no attributes.')
+            elif self._changetype == 'modify' and self._mod_attr is not None:
+                self._error(self._pos, 'Missing "-" after modification.')
+            elif self._changetype in ['modrdn', 'moddn']:
+                for attr_type in [b'newrdn', b'deleteoldrdn']:
+                    if attr_type not in self._modrdn_attrs:
+                        self._error(self._pos, 'Missing %s: in %s record.'
+                            % (attr_type.decode('ascii'), self._changetype))
+        self._reset_record()
+
+    def _check_lines(self, text, line_counter, byte_counter):
+        """Check a single raw record line by line.
+
+        line_counter and byte_counter are the number and offset of the
+        first line of the record.
+        """
+        pending = None  # first physical line of the current unfolded line
+        pending_pos = None
+        pieces = None  # all physical lines if the current line is folded
+
+        lines = text.split(b'\n')
+        last = len(lines) - 1  # the last line is not terminated
+        for i, line in enumerate(lines):
+            pos = (line_counter, byte_counter)
+            line_counter += 1
+            byte_counter += len(line) + 1
+            if line[-1:] == b'\r' and i < last:
+                line = line[:-1]
+
+            if line[:1] == b' ':
+                if pending is None:
+                    self._error(pos, 'Continuation line without preceding '
+                        'line.')
+                elif pieces is None:
+                    pieces = [pending, line[1:]]
+                else:
+                    pieces.append(line[1:])
+            elif line:
+                if pending is not None:
+                    if pieces is not None:
+                        pending = b''.join(pieces)
+                        pieces = None
+                    self._check_line(pending_pos, pending)
+                pending = line
+                pending_pos = pos
+
+        if pending is not None:
+            if pieces is not None:
+                pending = b''.join(pieces)
+            self._check_line(pending_pos, pending)
+        self._end_record()
+
+    def _check_records(self, text, start, end):
+        """Check the records in text[start:end] line by line.
+
+        Records must be checked in order within a chunk: the line number
+        is counted on from the end of the previous record.
+        """
+        for start, end in _iter_record_spans(text, start, end):
+            self._chunk_lines += text.count(b'\n', self._chunk_pos, start)
+            self._chunk_pos = start
+            self._check_lines(text[start:end],
+                self.line_counter + self._chunk_lines + 1,
+                self.byte_counter + start)
+
+    def _add_entries(self, text, start, end, count):
+        """Account for count valid entries in text[start:end]."""
+        if self._kind == 'change':
+            # rare: let the full check report them
+            self._check_records(text, start, end)
+        else:
+            self._kind = 'content'
+            self.records_read += count
+
+    def _iter_chunks(self):
+        """Iterate chunks of the input that end at a record boundary."""
+        buf = b''
+        for data in iter(
+                lambda: self._input_file.read(VALIDATE_CHUNK_SIZE), b''):
+            buf += data
+            cut = max(buf.rfind(b'\n\n'), buf.rfind(b'\n\r\n'))
+            if cut != -1:
+                yield buf[:cut + 1]
+                buf = buf[cut + 1:]
+        if buf:
+            yield buf
+
+    def validate(self):
+        """Iterate all errors in the input.
+
+        :rtype: Iterator[ValidationError]
+        """
+        scanner = _RecordScanner()
+        results = _imap(scanner, self._iter_chunks(), self._jobs, 1)
+        for text, (failures, ok) in results:
+            self._chunk_pos = 0
+            self._chunk_lines = 0
+            done = 0
+            prev_end = 0
+            for start, end, ok_before in failures:
+                if ok_before > done:
+                    self._add_entries(text, prev_end, start, ok_before - done)
+                    done = ok_before
+                self._check_records(text, start, end)
+                prev_end = end
+            if ok > done:
+                self._add_entries(text, prev_end, len(text), ok - done)
+
+            self.line_counter += text.count(b'\n')
+            if text[-1:] != b'\n':
+                self.line_counter += 1
+            self.byte_counter += len(text)
+
+            for error in self._errors:
+                yield error
+            self._errors = []
+
+
+def _open_input(path):
+    if path == '-':
+        return getattr(sys.stdin, 'buffer', sys.stdin)
+    return open(path, 'rb')
+
+
+def _open_output(path):
+    if path == '-':
+        return getattr(sys.stdout, 'buffer', sys.stdout)
+    return open(path, 'wb')
+
+
+def _unparse_block(block):
+    """Return the raw bytes of a record from a list of unfolded lines."""
+    return b'\n'.join(block) + b'\n\n'
+
+
+def _is_dn_line(line):
+    return line[:3].lower() == b'dn:'
+
+
+def _attr_descs(line):
+    """Return the lowercased attribute description of a line and the
+    attribute type without options (e.g. ``cn;lang-en`` and ``cn``)."""
+    desc = line.split(b':', 1)[0].lower()
+    return desc, desc.split(b';', 1)[0]
+
+
+def _block_dn(parser, block):
+    """Return the dn of a record without parsing the other lines."""
+    for line in block:
+        if _is_dn_line(line):
+            return parser._parse_attr(line)[1]
+
+
+class _Records(object):
+    """Iterate the raw records of a parser, skipping records without dn.
+
+    A standalone ``version: 1`` record is the most common example.
+    Unlike the parser, ``records_read`` only counts records that are not
+    skipped.
+    """
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.records_read = 0
+
+    @property
+    def byte_counter(self):
+        return self.parser.byte_counter
+
+    def __iter__(self):
+        for block in self.parser._iter_blocks():
+            for line in block:
+                if _is_dn_line(line):
+                    self.records_read += 1
+                    yield block
+                    break
+
+
+def _imap(func, items, jobs, chunksize=256):
+    """Iterate (item, func(item)) for all items, in order.
+
+    With more than one job, func is applied in worker processes. Only a
+    limited number of items is read ahead.
+    """
+    if jobs > 1:
+        items = iter(items)
+        pool = multiprocessing.Pool(jobs)
+        try:
+            pending = None
+            while True:
+                window = list(itertools.islice(items, jobs * chunksize * 2))
+                if pending is not None:
+                    for pair in zip(pending[0], pending[1].get()):
+                        yield pair
+                if not window:
+                    break
+                pending = (window, pool.map_async(func, window, chunksize))
+        finally:
+            pool.terminate()
+    else:
+        for item in items:
+            yield item, func(item)
+
+
+class _GrepCommand(object):
+    """Return records that match a DN pattern and attribute filters."""
+
+    def __init__(self, parser, dn=None, filters=[], ignore_case=False,
+            invert=False):
+        flags = re.IGNORECASE if ignore_case else 0
+        self._parser = parser
+        self._dn = re.compile(dn, flags) if dn is not None else None
+        self._filters = []
+        for f in filters:
+            if '=' not in f:
+                raise ValueError(
+                    'Filter must have the form ATTR=REGEX: %s' % f)
+            attr_type, pattern = f.split('=', 1)
+            self._filters.append((
+                attr_type.lower().encode('ascii'),
+                re.compile(pattern, flags)))
+        self._invert = invert
+
+    def _match_filter(self, block, attr_type, regex):
+        for line in block:
+            if attr_type in _attr_descs(line):
+                value = _text(self._parser._parse_attr(line)[1])
+                if regex.search(value):
+                    return True
+        return False
+
+    def _match(self, block):
+        if self._dn is not None:
+            dn = _block_dn(self._parser, block)
+            if dn is None or not self._dn.search(dn):
+                return False
+        for attr_type, regex in self._filters:
+            if not self._match_filter(block, attr_type, regex):
+                return False
+        return True
+
+    def __call__(self, block):
+        if self._match(block) != self._invert:
+            return _unparse_block(block)
+
+
+class _ProjectCommand(object):
+    """Return records with only the dn and the given attribute types.
+
+    An attribute type without options also matches all its options.
+    """
+
+    def __init__(self, attr_types):
+        self._attr_types = set(a.lower().encode('ascii') for a in attr_types)
+        self._attr_types.add(b'dn')
+
+    def _keep(self, line):
+        desc, attr_type = _attr_descs(line)
+        return desc in self._attr_types or attr_type in self._attr_types
+
+    def __call__(self, block):
+        return _unparse_block([line for line in block if self._keep(line)])
+
+
+def _cmd_count(args, records, output_file):
+    count = 0
+    for block in records:
+        count += 1
+    output_file.write(('%i\n' % count).encode('ascii'))
+
+
+def _cmd_grep(args, records, output_file):
+    func = _GrepCommand(LDIFParser(None, strict=False), args.dn,
+        args.filter, args.ignore_case, args.invert_match)
+    for block, result in _imap(func, records, args.jobs):
+        if result is not None:
+            output_file.write(result)
+
+
+def _cmd_project(args, records, output_file):
+    func = _ProjectCommand(args.attr_types)
+    for block, result in _imap(func, records, args.jobs):
+        output_file.write(result)
+
+
+def _cmd_split(args, records, output_file):
+    outputs = [open('%s%i.ldif' % (args.prefix, i), 'wb')
+        for i in range(args.shards)]
+    try:
+        for i, block in enumerate(records):
+            if args.hash:
+                dn = _block_dn(records.parser, block) or ''
+                key = ','.join(dn_sort_key(dn)).encode('utf8')
+                i = zlib.crc32(key) & 0xffffffff
+            outputs[i % args.shards].write(_unparse_block(block))
+    finally:
+        for f in outputs:
+            f.close()
+
+
+def _cmd_sort(args, records, output_file):
+    merger = LDIFMerger([records.parser], policy=args.policy, sort=True,
+        spill_records=args.spill_records)
+    merger.unparse(LDIFWriter(output_file))
+    records.records_read = merger.records_read
+
+
+def _cmd_validate(args, validator, output_file):
+    errors = 0
+    for error in validator.validate():
+        errors += 1
+        msg = 'line %i (byte %i): %s\n' % error
+        output_file.write(msg.encode('utf8'))
+    return 1 if errors else 0
+
+
+def _print_stats(reader, seconds):
+    seconds = max(seconds, 1e-9)
+    sys.stderr.write(
+        '%i records, %i bytes in %.2fs (%.0f records/s, %.1f MB/s)\n' % (
+            reader.records_read,
+            reader.byte_counter,
+            seconds,
+            reader.records_read / seconds,
+            reader.byte_counter / seconds / 1e6))
+
+
+def _records(input_file, args):
+    return _Records(LDIFParser(input_file, strict=False))
+
+
+def _validator(input_file, args):
+    return LDIFValidator(input_file, jobs=args.jobs)
+
+
+def _get_argument_parser():
+    ap = argparse.ArgumentParser(prog='ldif3',
+        description='Process LDIF files (see RFC 2849).')
+    ap.add_argument('--version', action='version', version=__version__)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('input', nargs='?', default='-',
+        help='input file (default: stdin)')
+    common.add_argument('-o', '--output', default='-',
+        help='output file (default: stdout)')
+    common.add_argument('--stats', action='store_true',
+        help='print throughput statistics to stderr')
+
+    jobs = argparse.ArgumentParser(add_help=False)
+    jobs.add_argument('-j', '--jobs', type=int, default=1,
+        help='number of worker processes (default: 1)')
+
+    subparsers = ap.add_subparsers(dest='command')
+    subparsers.required = True
+
+    p = subparsers.add_parser('count', parents=[common],
+        help='count records')
+    p.set_defaults(func=_cmd_count, reader=_records)
+
+    p = subparsers.add_parser('grep', parents=[common, jobs],
+        help='print records that match a DN and/or attribute filters')
+    p.add_argument('-d', '--dn', help='regular expression to match the dn')
+    p.add_argument('-f', '--filter', action='append', default=[],
+        metavar='ATTR=REGEX',
+        help='regular expression to match any value of ATTR (including '
+            'ATTR with options, e.g. cn;lang-en for cn); '
+            'can be given multiple times')
+    p.add_argument('-i', '--ignore-case', action='store_true')
+    p.add_argument('-v', '--invert-match', action='store_true')
+    p.set_defaults(func=_cmd_grep, reader=_records)
+
+    p = subparsers.add_parser('project', parents=[common, jobs],
+        help='print records with only the given attribute types and options')
+    p.add_argument('-a', '--attr', dest='attr_types', action='append',
+        default=[], required=True, metavar='ATTR',
+        help='attribute type to keep; can be given multiple times')
+    p.set_defaults(func=_cmd_project, reader=_records)
+
+    p = subparsers.add_parser('split', parents=[common],
+        help='split records into multiple files')
+    p.add_argument('-n', '--shards', type=int, required=True,
+        help='number of output files')
+    p.add_argument('--prefix', default='shard',
+        help='prefix for output files (default: shard)')
+    p.add_argument('--hash', action='store_true',
+        help='assign records to files by dn instead of round robin')
+    p.set_defaults(func=_cmd_split, reader=_records)
+
+    p = subparsers.add_parser('sort', parents=[common],
+        help='sort records by dn, parents first')
+    p.add_argument('--policy', choices=MERGE_POLICIES, default='last',
+        help='how to handle duplicate dns (default: last)')
+    p.add_argument('--spill-records', type=int, default=100000,
+        help='number of records to sort in memory (default: 100000)')
+    p.set_defaults(func=_cmd_sort, reader=_records)
+
+    p = subparsers.add_parser('validate', parents=[common, jobs],
+        help='print errors for invalid records')
+    p.set_defaults(func=_cmd_validate, reader=_validator)
+
+    return ap
+
+
+def main(argv=None):
+    """Entry point for the ``ldif3`` command."""
+    ap = _get_argument_parser()
+    args = ap.parse_args(argv)
+    if args.command == 'split' and args.shards < 1:
+        ap.error('the number of shards must be at least 1')
+    input_file = _open_input(args.input)
+    output_file = _open_output(args.output)
+    reader = args.reader(input_file, args)
+
+    start = time.time()
+    try:
+        status = args.func(args, reader, output_file)
+        output_file.flush()
+    finally:
+        if input_file is not getattr(sys.stdin, 'buffer', sys.stdin):
+            input_file.close()
+        if output_file is not getattr(sys.stdout, 'buffer', sys.stdout):
+            output_file.close()
+
+    if args.stats:
+        _print_stats(reader, time.time() - start)
+    return status or 0
+
+
+if __name__ == '__main__':  # pragma: nocover
+    sys.exit(main())
@@ -23,6 +23,9 @@ setup(
     author='Tobias Bengfort',
     author_email='tobias.bengfort@posteo.de',
     py_modules=['ldif3'],
+    entry_points={
+        'console_scripts': ['ldif3=ldif3:main'],
+    },
     license='BSD',
     classifiers=[
         'Development Status :: 4 - Beta',
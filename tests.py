@@ -2,6 +2,10 @@
 
 from __future__ import unicode_literals
 
+import os
+import shutil
+import sys
+import tempfile
 import unittest
 
 try:
@@ -9,10 +13,15 @@ try:
 except ImportError:
     import mock
 
-from io import BytesIO
+from io import BytesIO, StringIO
 
 import ldif3
 
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
 
 BYTES = b"""version: 1
 dn: cn=Alice Alison,
@@ -163,6 +172,29 @@ class TestIsDn(unittest.TestCase):
         pass  # TODO
 
 
+class TestSplitDn(unittest.TestCase):
+    def test_happy(self):
+        self.assertEqual(ldif3.split_dn('cn=foo, dc=example,dc=com'),
+            ['cn=foo', 'dc=example', 'dc=com'])
+
+    def test_empty(self):
+        self.assertEqual(ldif3.split_dn(''), [])
+
+    def test_escaped(self):
+        self.assertEqual(ldif3.split_dn(r'cn=foo\, bar,dc=com'),
+            [r'cn=foo\, bar', 'dc=com'])
+
+    def test_quoted(self):
+        self.assertEqual(ldif3.split_dn('cn="foo, bar",dc=com'),
+            ['cn="foo, bar"', 'dc=com'])
+
+    def test_escaped_trailing_space(self):
+        self.assertEqual(ldif3.split_dn(r'cn=foo\  , dc=com'),
+            [r'cn=foo\ ', 'dc=com'])
+        self.assertEqual(ldif3.split_dn(r'cn=foo\\ ,dc=com'),
+            [r'cn=foo\\', 'dc=com'])
+
+
 class TestLDIFParser(unittest.TestCase):
     def setUp(self):
         self.stream = BytesIO(BYTES)
@@ -229,6 +261,20 @@ class TestLDIFParser(unittest.TestCase):
         self.assertEqual(attr_type, 'foo')
         self.assertEqual(attr_value, 'a\nb\nc')
 
+    def test_parse_attr_plain(self):
+        attr_type, attr_value = self.p._parse_attr(b'foo:  bar \n')
+        self.assertEqual(attr_type, 'foo')
+        self.assertEqual(attr_value, 'bar')
+
+    def test_parse_attr_plain_non_utf8(self):
+        attr_type, attr_value = self.p._parse_attr(b'foo: \xb3\n')
+        self.assertEqual(attr_value, b'\xb3')
+
+    def test_parse_attr_type_cache(self):
+        first, _ = self.p._parse_attr(b'foo: bar')
+        second, _ = self.p._parse_attr(b'foo: baz')
+        self.assertIs(first, second)
+
     def test_parse_attr_url(self):
         self.p._process_url_schemes = [b'https']
         attr_type, attr_value = self.p._parse_attr(b'foo:< ' + URL + b'\n')
@@ -263,6 +309,27 @@ class TestLDIFParser(unittest.TestCase):
             self.assertEqual(dn, DNS[i])
             self.assertEqual(record, RECORDS[i])
 
+    def test_checkpoint(self):
+        parse = self.p.parse()
+        self.assertEqual(self.p.checkpoint, (0, 0, 0))
+        next(parse)
+        offset = BYTES.index(b'\n\n') + 2
+        self.assertEqual(self.p.checkpoint, (offset, 10, 1))
+        next(parse)
+        self.assertEqual(self.p.checkpoint, (len(BYTES), 16, 2))
+
+    def test_resume_from_checkpoint(self):
+        parse = self.p.parse()
+        next(parse)
+        checkpoint = self.p.checkpoint
+
+        p = ldif3.LDIFParser(BytesIO(BYTES), checkpoint=checkpoint)
+        self.assertEqual(list(p.parse()), list(parse))
+        self.assertEqual(p.line_counter, self.p.line_counter)
+        self.assertEqual(p.byte_counter, self.p.byte_counter)
+        self.assertEqual(p.records_read, self.p.records_read)
+        self.assertEqual(p.checkpoint, self.p.checkpoint)
+
     def test_parse_binary(self):
         self.stream = BytesIO(b'dn: cn=Bjorn J Jensen\n'
             b'jpegPhoto:: 8PLz\nfoo: bar')
@@ -302,6 +369,517 @@ class TestLDIFParserEmptyAttrValue(unittest.TestCase):
         self.assertEqual(record['aliases'], ['', 'foo.bar'])
 
 
+class TestLDIFBatch(unittest.TestCase):
+    def setUp(self):
+        self.p = ldif3.LDIFParser(BytesIO(BYTES))
+
+    def test_parse_batches(self):
+        batches = list(self.p.parse_batches())
+        self.assertEqual(len(batches), 1)
+        batch = batches[0]
+        self.assertEqual(batch.dn, DNS)
+        self.assertEqual(list(batch.columns.keys()),
+            ['objectclass', 'cn', 'mail', 'modifytimestamp'])
+        for i, record in enumerate(RECORDS):
+            for attr_type, column in batch.columns.items():
+                self.assertEqual(column[i], record.get(attr_type, []))
+
+    def test_parse_batches_size(self):
+        batches = list(self.p.parse_batches(size=1))
+        self.assertEqual([batch.dn for batch in batches], [[DNS[0]], [DNS[1]]])
+        self.assertEqual(len(batches[1].columns['mail']), 1)
+        self.assertNotIn('cn', batches[1].columns)
+
+    def test_parse_batches_new_column(self):
+        self.p = ldif3.LDIFParser(BytesIO(BYTES.replace(b'cn: ', b'sn: ')))
+        batch = list(self.p.parse_batches())[0]
+        self.assertEqual(list(batch.columns['sn'].offsets), [0, 1, 1])
+        self.assertEqual(batch.columns['sn'][1], [])
+
+    def test_parse_batches_attr_types(self):
+        batch = list(self.p.parse_batches(attr_types=['CN', 'uid']))[0]
+        self.assertEqual(list(batch.columns.keys()), ['CN', 'uid'])
+        self.assertEqual(batch.columns['CN'][0], ['Alison Alison'])
+        self.assertEqual(batch.columns['CN'][1], [])
+        self.assertEqual(len(batch.columns['uid']), 2)
+
+    def test_parse_batches_skip_without_dn(self):
+        data = b'version: 1\n\n' + BYTES.replace(b'version: 1\n', b'')
+        self.p = ldif3.LDIFParser(BytesIO(data))
+        batch = list(self.p.parse_batches(attr_types=['mail']))[0]
+        self.assertEqual(batch.dn, DNS)
+        stream = StringIO()
+        batch.write_csv(stream, header=False)
+        self.assertEqual(stream.getvalue(), (
+            '"cn=Alice Alison,mail=alicealison@example.com",'
+            'alicealison@example.com\r\n'
+            'mail=foobar@example.org,foobar@example.org\r\n'))
+
+    def test_raw_buffers(self):
+        self.p = ldif3.LDIFParser(BytesIO(b'dn: cn=Bjorn J Jensen\n'
+            b'jpegPhoto:: 8PLz\nfoo: bar\nfoo: baz'))
+        batch = list(self.p.parse_batches())[0]
+        column = batch.columns['foo']
+        self.assertEqual(column.data, bytearray(b'barbaz'))
+        self.assertEqual(list(column.value_offsets), [0, 3, 6])
+        self.assertEqual(list(column.offsets), [0, 2])
+        self.assertEqual(column.raw(0), [b'bar', b'baz'])
+        self.assertEqual(column[0], ['bar', 'baz'])
+        self.assertEqual(batch.columns['jpegPhoto'][0], [b'\xf0\xf2\xf3'])
+
+    def test_latin1(self):
+        self.p = ldif3.LDIFParser(BytesIO(b'dn: cn=foo\ncn: J\xfcrgen\n'),
+            encoding='latin1')
+        batch = list(self.p.parse_batches())[0]
+        self.assertEqual(batch.columns['cn'][0], ['J\xfcrgen'])
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_to_arrow(self):
+        batch = list(self.p.parse_batches())[0]
+        table = batch.to_arrow().to_pydict()
+        self.assertEqual(table['dn'], DNS)
+        self.assertEqual(table['objectclass'],
+            [RECORDS[0]['objectclass'], RECORDS[1]['objectclass']])
+        self.assertEqual(table['cn'], [['Alison Alison'], []])
+
+    def test_write_csv(self):
+        batch = list(self.p.parse_batches(attr_types=['objectclass']))[0]
+        stream = StringIO()
+        batch.write_csv(stream)
+        self.assertEqual(stream.getvalue(), (
+            'dn,objectclass\r\n'
+            '"cn=Alice Alison,mail=alicealison@example.com",'
+            'top|person|organizationalPerson\r\n'
+            'mail=foobar@example.org,top|person\r\n'))
+
+    def test_write_csv_quoting(self):
+        self.p = ldif3.LDIFParser(BytesIO(b'dn: cn=foo\n'
+            b'description: say "hi"\n'))
+        batch = list(self.p.parse_batches())[0]
+        stream = StringIO()
+        batch.write_csv(stream, header=False)
+        self.assertEqual(stream.getvalue(), 'cn=foo,"say ""hi"""\r\n')
+
+    def test_write_ndjson(self):
+        self.p = ldif3.LDIFParser(BytesIO(b'dn: cn=Bjorn J Jensen\n'
+            b'jpegPhoto:: 8PLz\nfoo: bar'))
+        batch = list(self.p.parse_batches())[0]
+        stream = StringIO()
+        batch.write_ndjson(stream)
+        self.assertEqual(stream.getvalue(), '{"dn": "cn=Bjorn J Jensen", '
+            '"jpegPhoto": ["8PLz"], "foo": ["bar"]}\n')
+
+
+class TestLDIFFeedParser(unittest.TestCase):
+    def setUp(self):
+        self.p = ldif3.LDIFFeedParser()
+
+    def _feed_chunks(self, data, size):
+        for i in range(0, len(data), size):
+            self.p.feed(data[i:i + size])
+
+    def _assert_records(self, items):
+        self.assertEqual([dn for dn, entry in items], DNS)
+        self.assertEqual([entry for dn, entry in items], RECORDS)
+
+    def test_feed(self):
+        self.p.feed(BYTES)
+        self.p.close()
+        self._assert_records(list(self.p.records()))
+
+    def test_feed_bytewise(self):
+        self._feed_chunks(BYTES, 1)
+        self.p.close()
+        self._assert_records(list(self.p.records()))
+        self.assertEqual(self.p.byte_counter, len(BYTES))
+        self.assertEqual(self.p.line_counter, 16)
+
+    def test_feed_crlf_split(self):
+        data = BYTES.replace(b'\n', b'\r\n')
+        self._feed_chunks(data, 7)
+        self.p.close()
+        self._assert_records(list(self.p.records()))
+
+    def test_records_before_close(self):
+        self.p.feed(BYTES[:BYTES.index(b'\n\n') + 1])
+        self.assertEqual(list(self.p.records()), [])
+        self.p.feed(b'\n# another')
+        items = list(self.p.records())
+        self.assertEqual(items, [(DNS[0], RECORDS[0])])
+        self.assertEqual(list(self.p.records()), [])
+
+    def test_error_keeps_remaining_records(self):
+        self.p.feed(b'cn: x\n\ndn: cn=ok,dc=com\ncn: y\n\n')
+        with self.assertRaises(ValueError):
+            list(self.p.records())
+        self.assertEqual(list(self.p.records()),
+            [('cn=ok,dc=com', {'cn': ['y']})])
+
+    def test_parse(self):
+        self.p.feed(BYTES)
+        self.p.close()
+        self._assert_records(list(self.p.parse()))
+
+    def test_feed_memoryview(self):
+        self._feed_chunks(memoryview(BYTES), 7)
+        self.p.close()
+        self._assert_records(list(self.p.records()))
+
+    def test_parse_batches(self):
+        self.p.feed(BYTES)
+        self.p.close()
+        batches = list(self.p.parse_batches(size=1))
+        self.assertEqual([batch.dn for batch in batches], [[DNS[0]], [DNS[1]]])
+        self.assertEqual(list(self.p.parse_batches()), [])
+
+    def test_feed_after_close(self):
+        self.p.close()
+        with self.assertRaises(ValueError):
+            self.p.feed(BYTES)
+
+
+class TestDNTree(unittest.TestCase):
+    def setUp(self):
+        self.tree = ldif3.DNTree()
+        self.tree.update([
+            ('ou=people,dc=example,dc=com', {'ou': ['people']}),
+            ('dc=example,dc=com', {'dc': ['example']}),
+            ('cn=alice,ou=people,dc=example,dc=com', {'cn': ['alice']}),
+            ('cn=bob,ou=missing,dc=example,dc=com', {'cn': ['bob']}),
+            ('cn=carol,ou=People,dc=example,dc=com', {'cn': ['carol']}),
+        ])
+
+    def test_len(self):
+        self.assertEqual(len(self.tree), 5)
+
+    def test_contains(self):
+        self.assertIn('OU=People,dc=example,dc=com', self.tree)
+        self.assertNotIn('ou=missing,dc=example,dc=com', self.tree)
+        self.assertNotIn('dc=com', self.tree)
+        self.assertNotIn('dc=org', self.tree)
+
+    def test_get(self):
+        self.assertEqual(self.tree.get('dc=example,dc=com'),
+            {'dc': ['example']})
+        self.assertIsNone(self.tree.get('dc=com'))
+
+    def test_parent(self):
+        self.assertEqual(
+            self.tree.parent('cn=alice,ou=people,dc=example,dc=com'),
+            'ou=people,dc=example,dc=com')
+        self.assertIsNone(self.tree.parent('dc=example,dc=com'))
+        self.assertIsNone(
+            self.tree.parent('cn=bob,ou=missing,dc=example,dc=com'))
+
+    def test_children(self):
+        children = self.tree.children('ou=people,dc=example,dc=com')
+        self.assertEqual(list(children), [
+            'cn=alice,ou=people,dc=example,dc=com',
+            'cn=carol,ou=People,dc=example,dc=com',
+        ])
+
+    def test_subtree(self):
+        dns = [dn for dn, entry in self.tree.subtree('dc=example,dc=com')]
+        self.assertEqual(dns, [
+            'dc=example,dc=com',
+            'ou=people,dc=example,dc=com',
+            'cn=alice,ou=people,dc=example,dc=com',
+            'cn=carol,ou=People,dc=example,dc=com',
+            'cn=bob,ou=missing,dc=example,dc=com',
+        ])
+
+    def test_children_normalized(self):
+        children = self.tree.children('OU=People, dc=example,dc=com')
+        self.assertEqual(list(children), [
+            'cn=alice,ou=people,dc=example,dc=com',
+            'cn=carol,ou=People,dc=example,dc=com',
+        ])
+
+    def test_escaped_trailing_space(self):
+        self.tree.add(r'cn=foo\ ,dc=example,dc=com', {'cn': ['foo ']})
+        self.assertIn(r'cn=foo\ ,dc=example,dc=com',
+            [dn for dn, entry in self.tree.subtree('dc=example,dc=com')])
+
+    def test_update_version(self):
+        tree = ldif3.DNTree()
+        tree.update(ldif3.LDIFParser(BytesIO(
+            b'version: 1\n\n' + BYTES_EMPTY_ATTR_VALUE)).parse())
+        self.assertEqual(len(tree), 1)
+
+    def test_add_none(self):
+        with self.assertRaises(ValueError):
+            self.tree.add(None, {})
+
+    def test_subtree_missing(self):
+        self.assertEqual(list(self.tree.subtree('dc=org')), [])
+
+    def test_roots(self):
+        self.assertEqual(list(self.tree.roots()), ['dc=example,dc=com'])
+
+    def test_orphans(self):
+        self.assertEqual(list(self.tree.orphans()),
+            ['cn=bob,ou=missing,dc=example,dc=com'])
+
+    def test_interned(self):
+        a = self.tree._find('cn=alice,ou=people,dc=example,dc=com')
+        b = self.tree._find('cn=bob,ou=missing,dc=example,dc=com')
+        self.assertIs(a.parent.parent, b.parent.parent)
+        self.assertIn('ou=people', self.tree._strings)
+        self.assertNotIn('cn=alice', self.tree._strings)
+
+    def test_original_dn(self):
+        tree = ldif3.DNTree()
+        tree.add('cn=x,ou=people,dc=com', {'cn': ['x']})
+        tree.add('ou=People, DC=com', {'ou': ['People']})
+        self.assertEqual([dn for dn, entry in tree.subtree()],
+            ['ou=People, DC=com', 'cn=x,ou=people,dc=com'])
+        self.assertEqual(tree.parent('cn=x,ou=people,dc=com'),
+            'ou=People, DC=com')
+
+    def test_unparse(self):
+        stream = BytesIO()
+        writer = ldif3.LDIFWriter(stream)
+        self.tree.unparse(writer, 'ou=people,dc=example,dc=com')
+        self.assertEqual(stream.getvalue(), (
+            b'dn: ou=people,dc=example,dc=com\nou: people\n\n'
+            b'dn: cn=alice,ou=people,dc=example,dc=com\ncn: alice\n\n'
+            b'dn: cn=carol,ou=People,dc=example,dc=com\ncn: carol\n\n'))
+
+
+MERGE_A = b"""dn: dc=example,dc=com
+dc: example
+
+dn: cn=alice,dc=example,dc=com
+cn: alice
+mail: alice@example.com
+
+dn: cn=bob,dc=example,dc=com
+cn: bob
+"""
+
+MERGE_B = b"""dn: dc=example,dc=com
+dc: example
+
+dn: CN=Alice,dc=example,dc=com
+cn: alice
+mail: alison@example.com
+
+dn: cn=carol,dc=example,dc=com
+cn: carol
+"""
+
+
+class TestLDIFMerger(unittest.TestCase):
+    def _merge(self, inputs, encoding='utf8', **kwargs):
+        parsers = [ldif3.LDIFParser(BytesIO(data), encoding=encoding)
+            for data in inputs]
+        self.m = ldif3.LDIFMerger(parsers, **kwargs)
+        return list(self.m.merge())
+
+    def test_dn_sort_key(self):
+        self.assertEqual(ldif3.dn_sort_key('CN=Alice, dc=com'),
+            ('dc=com', 'cn=alice'))
+
+    def test_last(self):
+        items = self._merge([MERGE_A, MERGE_B])
+        self.assertEqual([dn for dn, entry in items], [
+            'dc=example,dc=com',
+            'CN=Alice,dc=example,dc=com',
+            'cn=bob,dc=example,dc=com',
+            'cn=carol,dc=example,dc=com',
+        ])
+        self.assertEqual(items[1][1]['mail'], ['alison@example.com'])
+        self.assertEqual(self.m.records_read, 6)
+        self.assertEqual(self.m.duplicates, 2)
+
+    def test_union(self):
+        items = self._merge([MERGE_A, MERGE_B], policy='union')
+        self.assertEqual(items[1], ('cn=alice,dc=example,dc=com', {
+            'cn': ['alice'],
+            'mail': ['alice@example.com', 'alison@example.com'],
+        }))
+
+    def test_union_attr_type_case(self):
+        items = self._merge([MERGE_A, MERGE_B.replace(b'mail:', b'Mail:')],
+            policy='union')
+        self.assertEqual(items[1], ('cn=alice,dc=example,dc=com', {
+            'cn': ['alice'],
+            'mail': ['alice@example.com', 'alison@example.com'],
+        }))
+
+    def test_error(self):
+        with self.assertRaises(ValueError):
+            self._merge([MERGE_A, MERGE_B], policy='error')
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            self._merge([MERGE_A], policy='first')
+
+    def test_unsorted(self):
+        unsorted = MERGE_B.split(b'\n\n')
+        unsorted.reverse()
+        with self.assertRaises(ValueError):
+            self._merge([MERGE_A, b'\n\n'.join(unsorted)])
+
+    def test_sort(self):
+        unsorted = MERGE_B.split(b'\n\n')
+        unsorted.reverse()
+        data = b'\n\n'.join(unsorted)
+        expected = self._merge([MERGE_A, MERGE_B])
+        for spill_records in [1, 2, 10]:
+            items = self._merge([MERGE_A, data], sort=True,
+                spill_records=spill_records)
+            self.assertEqual(items, expected)
+
+    def test_sort_spill_non_ascii(self):
+        data = (b'dn: cn=b\ncn: J\xfcrgen\njpegPhoto:: 8PLz\n\n'
+            b'dn: cn=a\ncn: a\n')
+        for encoding in ['latin1', 'utf8', None]:
+            expected = self._merge([data], sort=True, encoding=encoding)
+            items = self._merge([data], sort=True, spill_records=1,
+                encoding=encoding)
+            self.assertEqual(items, expected)
+            self.assertEqual(len(items), 2)
+
+    def test_skip_without_dn(self):
+        items = self._merge([b'version: 1\n\n' + MERGE_A])
+        self.assertEqual(len(items), 3)
+        items = self._merge([b'version: 1\n\n' + MERGE_A], sort=True)
+        self.assertEqual(len(items), 3)
+
+    def test_unparse(self):
+        parsers = [ldif3.LDIFParser(BytesIO(BYTES))]
+        stream = BytesIO()
+        ldif3.LDIFMerger(parsers, sort=True).unparse(ldif3.LDIFWriter(stream))
+        self.assertEqual(stream.getvalue(), BYTES_OUT)
+
+
+class TestLDIFValidator(unittest.TestCase):
+    def _validate(self, data):
+        self.v = ldif3.LDIFValidator(BytesIO(data))
+        return list(self.v.validate())
+
+    def _messages(self, data):
+        return [error.message for error in self._validate(data)]
+
+    def test_valid(self):
+        self.assertEqual(self._validate(BYTES), [])
+        self.assertEqual(self.v.records_read, 2)
+        self.assertEqual(self.v.line_counter, 16)
+        self.assertEqual(self.v.byte_counter, len(BYTES))
+
+    def test_valid_crlf(self):
+        self.assertEqual(self._validate(BYTES.replace(b'\n', b'\r\n')), [])
+
+    def test_valid_changes(self):
+        self.assertEqual(self._validate(
+            b'dn: cn=foo,dc=com\nchangetype: modify\n'
+            b'add: mail\nmail: foo@example.com\n-\n'
+            b'delete: description\n-\n\n'
+            b'dn: cn=bar,dc=com\nchangetype: modrdn\n'
+            b'newrdn: cn=baz\ndeleteoldrdn: 1\n\n'
+            b'dn: cn=baz,dc=com\nchangetype: delete\n'), [])
+
+    def test_positions(self):
+        data = b'dn: cn=foo,dc=com\ncn: foo\n\ndn: cn=bar,dc=com\nfoo:: YQ\n'
+        self.assertEqual(self._validate(data), [
+            (5, data.index(b'foo::'), 'Invalid base64 value.'),
+        ])
+
+    def test_all_errors(self):
+        self.assertEqual(self._messages(
+            b'cn: foo\n\n'
+            b' folded\n'
+            b'dn: invalid\ndn: cn=foo\nfoo_bar: x\nmissing colon\n'), [
+            'First line of record does not start with "dn:": cn',
+            'Continuation line without preceding line.',
+            'No valid string-representation of distinguished name '
+                'invalid.',
+            'Two lines starting with dn: in one record.',
+            'Invalid attribute type foo_bar.',
+            'Missing ":" in line.',
+        ])
+
+    def test_unsafe_value(self):
+        self.assertEqual(self._messages(b'dn: cn=foo\ncn: :foo\n'),
+            ['Value contains unsafe characters.'])
+
+    def test_no_attributes(self):
+        self.assertEqual(self._messages(b'dn: cn=foo\n'),
+            ['Record has no attributes.'])
+
+    def test_changetype(self):
+        self.assertEqual(self._messages(
+            b'dn: cn=foo\ncn: foo\nchangetype: add\n\n'
+            b'dn: cn=foo\nchangetype: foo\nchangetype: add\n'), [
+            'changetype: must directly follow dn:.',
+            'changetype value foo is invalid.',
+            'Mixing content and change records.',
+            'Two lines starting with changetype: in one record.',
+        ])
+
+    def test_modify(self):
+        self.assertEqual(self._messages(
+            b'dn: cn=foo\nchangetype: modify\n'
+            b'mail: foo@example.com\n'
+            b'add: mail\ncn: foo\n'
+            b'replace: cn\n'), [
+            'Expected add:, delete: or replace: in modify record.',
+            'Attribute type cn does not match modification.',
+            'Missing "-" after modification.',
+            'Missing "-" after modification.',
+        ])
+
+    def test_modrdn(self):
+        self.assertEqual(self._messages(
+            b'dn: cn=foo\nchangetype: modrdn\n'
+            b'deleteoldrdn: 2\ncn: foo\n'), [
+            'deleteoldrdn value must be 0 or 1.',
+            'Unexpected attribute type cn in modrdn record.',
+            'Missing newrdn: in modrdn record.',
+        ])
+
+    def test_content_after_changes(self):
+        self.assertEqual(self._validate(
+            b'dn: cn=foo\nchangetype: delete\n\n'
+            b'dn: cn=bar\ncn: bar\n'), [
+            (5, 42, 'Mixing content and change records.'),
+        ])
+
+    def test_many_change_records(self):
+        record = b'dn: cn=foo,dc=com\nchangetype: delete\n\n'
+        data = record * 50000 + b'dn: cn=foo,dc=com\nchangetype: foo\n'
+        self.assertEqual(self._validate(data), [
+            (150002, len(record) * 50000 + 18,
+                'changetype value foo is invalid.'),
+        ])
+        self.assertEqual(self.v.records_read, 50001)
+
+    def test_chunks(self):
+        invalid = BYTES.replace(b'version: 1\n', b'').replace(
+            b'dn: mail=', b'dn: mail')
+        data = BYTES + b'\n\r\n' + invalid
+        expected = self._validate(data)
+        self.assertEqual(len(expected), 1)
+        chunk_size = ldif3.VALIDATE_CHUNK_SIZE
+        ldif3.VALIDATE_CHUNK_SIZE = 7
+        try:
+            self.assertEqual(self._validate(data), expected)
+        finally:
+            ldif3.VALIDATE_CHUNK_SIZE = chunk_size
+        self.assertEqual(self.v.records_read, 4)
+        self.assertEqual(self.v.line_counter, 33)
+        self.assertEqual(self.v.byte_counter, len(data))
+
+    def test_jobs(self):
+        data = BYTES + b'\n' + BYTES.replace(b'version: 1\n', b'').replace(
+            b'dn: mail=', b'dn: mail')
+        expected = self._validate(data)
+        v = ldif3.LDIFValidator(BytesIO(data), jobs=2)
+        self.assertEqual(list(v.validate()), expected)
+        self.assertEqual(v.records_read, 4)
+
+
 class TestLDIFWriter(unittest.TestCase):
     def setUp(self):
         self.stream = BytesIO()
@@ -397,3 +975,123 @@ class TestLDIFWriter(unittest.TestCase):
         self.w.unparse("o=x", {'test': [u'日本語']})
         value = self.stream.getvalue()
         self.assertEqual(value, b'dn: o=x\ntest:: 5pel5pys6Kqe\n\n')
+
+
+class TestMain(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.input = self._path('input.ldif')
+        self.output = self._path('output.ldif')
+        with open(self.input, 'wb') as fh:
+            fh.write(BYTES)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _path(self, name):
+        return os.path.join(self.tmpdir, name)
+
+    def _read(self, path):
+        with open(path, 'rb') as fh:
+            return fh.read()
+
+    def _main(self, *args):
+        status = ldif3.main(list(args) + [self.input, '-o', self.output])
+        return status, self._read(self.output)
+
+    def test_count(self):
+        self.assertEqual(self._main('count'), (0, b'2\n'))
+
+    def test_count_version_record(self):
+        with open(self.input, 'wb') as fh:
+            fh.write(b'version: 1\n\n' + BYTES.replace(b'version: 1\n', b''))
+        self.assertEqual(self._main('count'), (0, b'2\n'))
+
+    def test_count_stats(self):
+        with open(self.input, 'wb') as fh:
+            fh.write(b'version: 1\n\n' + BYTES.replace(b'version: 1\n', b''))
+        stderr = sys.stderr
+        sys.stderr = StringIO()
+        try:
+            self._main('count', '--stats')
+            stats = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+        self.assertTrue(stats.startswith('2 records, '), stats)
+
+    def test_split_no_shards(self):
+        stderr = sys.stderr
+        sys.stderr = StringIO()
+        try:
+            with self.assertRaises(SystemExit):
+                self._main('split', '-n', '0')
+        finally:
+            sys.stderr = stderr
+
+    def test_grep_dn_uppercase(self):
+        with open(self.input, 'wb') as fh:
+            fh.write(BYTES.replace(b'dn: mail=foo', b'DN: mail=foo'))
+        status, output = self._main('grep', '--dn', '^mail=foo')
+        self.assertTrue(output.startswith(b'DN: mail=foobar@example.org\n'))
+
+    def test_grep_dn(self):
+        status, output = self._main('grep', '--dn', '^mail=foo')
+        self.assertEqual(output, b'\n'.join(BLOCKS[1]) + b'\n\n')
+
+    def test_grep_filter(self):
+        status, output = self._main('grep', '-i', '-f', 'CN=^alison')
+        self.assertEqual(output, b'\n'.join(BLOCKS[0]) + b'\n\n')
+
+    def test_grep_invert(self):
+        status, output = self._main('grep', '-v', '-f', 'cn=Alison')
+        self.assertEqual(output, b'\n'.join(BLOCKS[1]) + b'\n\n')
+
+    def test_grep_jobs(self):
+        status, output = self._main('grep', '-j', '2', '-f', 'mail=example')
+        self.assertEqual(output, b''.join(
+            b'\n'.join(block) + b'\n\n' for block in BLOCKS))
+
+    def test_project(self):
+        status, output = self._main('project', '-a', 'Mail')
+        self.assertEqual(output, (
+            b'dn: cn=Alice Alison,mail=alicealison@example.com\n'
+            b'mail: alicealison@example.com\n\n'
+            b'dn: mail=foobar@example.org\n'
+            b'mail: foobar@example.org\n\n'))
+
+    def test_attr_options(self):
+        with open(self.input, 'wb') as fh:
+            fh.write(b'dn: cn=foo\ncn;lang-en: foo\nsn: bar\n')
+        status, output = self._main('grep', '-f', 'cn=^foo$')
+        self.assertEqual(output, b'dn: cn=foo\ncn;lang-en: foo\nsn: bar\n\n')
+        status, output = self._main('project', '-a', 'cn')
+        self.assertEqual(output, b'dn: cn=foo\ncn;lang-en: foo\n\n')
+        status, output = self._main('project', '-a', 'CN;lang-de')
+        self.assertEqual(output, b'dn: cn=foo\n\n')
+
+    def test_split(self):
+        prefix = self._path('shard')
+        self._main('split', '-n', '2', '--prefix', prefix)
+        for i in range(2):
+            p = ldif3.LDIFParser(open('%s%i.ldif' % (prefix, i), 'rb'))
+            self.assertEqual(list(p.parse()), [(DNS[i], RECORDS[i])])
+            p._input_file.close()
+
+    def test_sort(self):
+        status, output = self._main('sort')
+        self.assertEqual(output, BYTES_OUT)
+
+    def test_validate(self):
+        self.assertEqual(self._main('validate'), (0, b''))
+
+    def test_validate_invalid(self):
+        with open(self.input, 'wb') as fh:
+            fh.write(BYTES.replace(b'dn: mail=', b'dn: mail'))
+        status, output = self._main('validate')
+        self.assertEqual(status, 1)
+        msg = 'line 12 (byte %i): No valid string-representation' % (
+            BYTES.index(b'dn: mail='))
+        self.assertTrue(output.startswith(msg.encode('ascii')))
+
+    def test_validate_jobs(self):
+        self.assertEqual(self._main('validate', '-j', '2'), (0, b''))